@@ -1,10 +1,32 @@
+import hashlib
 import json
 from datetime import datetime, UTC
 from pathlib import Path
 import os
 from typing import Any
 import io
-import base64
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+# SIMD-accelerated drop-in for the stdlib encoder when available
+try:
+    import pybase64 as base64  # type: ignore
+except ImportError:
+    import base64
+# Faster JSON (de)serialization when available; orjson errors subclass json's
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+# Advisory file locking: fcntl on POSIX, msvcrt on Windows
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:
+    fcntl = None
+    import msvcrt
 def get_hackclub_api_key():
     # Fallback to a default value if not set in environment
     HACKCLUB_API_KEY = None
@@ -12,7 +34,11 @@ def get_hackclub_api_key():
 
 import streamlit as st
 import numpy as np
-import matplotlib.pyplot as plt
+import matplotlib
+# Logo is only rendered to PNG bytes, so skip GUI backend discovery
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.collections import PolyCollection
 from matplotlib import cm
 
@@ -23,20 +49,99 @@ try:
 except ImportError:
     openai = None  # type: ignore
     OPENAI_AVAILABLE = False
+try:
+    import httpx  # type: ignore
+except ImportError:
+    httpx = None  # type: ignore
+try:
+    import httpx_sse  # type: ignore
+except ImportError:
+    httpx_sse = None  # type: ignore
 
 
 
 st.set_page_config(page_title='Cortex Ai', layout='wide', page_icon='🤖')
 
-HISTORY_FILE = Path(__file__).with_name('chat_history.json')
+HISTORY_FILE = Path(__file__).with_name('chat_history.jsonl')
+LEGACY_HISTORY_FILE = Path(__file__).with_name('chat_history.json')
 SETTINGS_FILE = Path(__file__).with_name('user_settings.json')
+# Logo render parameters; bump version when the drawing code itself changes
+LOGO_PARAMS = {'version': 1, 'samples': 200, 'scale': 1.2, 'rotation': -20, 'width': 0.45, 'dpi': 64}
+# Streamlit serves ./static at app/static/ when server.enableStaticServing is on.
+# The file name is keyed on the render parameters so a stale logo is never reused.
+LOGO_FILE = Path(__file__).with_name('static') / (
+    f"logo-{hashlib.blake2b(repr(sorted(LOGO_PARAMS.items())).encode(), digest_size=4).hexdigest()}.png"
+)
+LOCK_TIMEOUT = 10.0
+HC_MODELS = {
+    'hackclub/model1': '🔧 Hack Club Model 1',
+    'hackclub/model2': '🔨 Hack Club Model 2'
+}
+HC_KEYS = list(HC_MODELS)
+HC_LABELS = list(HC_MODELS.values())
+HACKCLUB_CHAT_URL = 'https://ai.hackclub.com/proxy/v1/chat/completions'
+CHAT_RETRIES = 3
+CONTEXT_TOKEN_BUDGET = 2048
+CHAT_RETRY_DELAY = 0.25
 
-def load_saved_chats() -> list[dict]:
-    if not HISTORY_FILE.exists():
-        return []
+@contextmanager
+def locked(path: Path, timeout: float = LOCK_TIMEOUT):
+    """Hold an exclusive lock on a sidecar .lock file for path"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lock_path = path.with_suffix(path.suffix + '.lock')
+    with lock_path.open('a+b') as lock_fh:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    lock_fh.seek(0)
+                    msvcrt.locking(lock_fh.fileno(), msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Timed out waiting for lock on {path}")
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_fh.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_fh.seek(0)
+                msvcrt.locking(lock_fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+def dumps_json(obj: Any, indent: bool = False) -> bytes:
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode('utf-8')
+
+def loads_json(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def replace_bytes(path: Path, data: bytes) -> None:
+    """Write data to a temp file, fsync it, then atomically replace path; the caller holds locked(path)"""
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    with tmp_path.open('wb') as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp_path, path)
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """replace_bytes under the lock for path"""
+    with locked(path):
+        replace_bytes(path, data)
+
+def load_legacy_saved_chats() -> list[dict]:
+    """Read chat history written by older versions as a single JSON list"""
     try:
-        with HISTORY_FILE.open('r', encoding='utf-8') as fh:
-            data = json.load(fh)
+        with LEGACY_HISTORY_FILE.open('rb') as fh:
+            data = loads_json(fh.read())
             # Validate data structure
             if isinstance(data, list):
                 return data
@@ -46,121 +151,507 @@ def load_saved_chats() -> list[dict]:
         print(f"Debug: Error loading chat history: {e}")
         return []
 
+def file_mtime(path: Path) -> int:
+    """Modification time used to key the loader caches; 0 if the file is missing"""
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+def history_bytes(chats: list[dict]) -> bytes:
+    """Serialize chats (newest first) as history log lines, oldest first"""
+    return b''.join(dumps_json(chat) + b'\n' for chat in reversed(chats))
+
+@st.cache_data
+def _load_saved_chats_cached(mtime: int) -> list[dict]:
+    """Replay the append-only history log, newest chat first"""
+    # Held across the read and any rewrite so concurrent appends aren't lost
+    try:
+        with locked(HISTORY_FILE):
+            return replay_history(rewrite=True)
+    except (OSError, TimeoutError) as e:
+        # e.g. a read-only checkout; read without migrating or compacting
+        print(f"Debug: Error locking chat history: {e}")
+        return replay_history(rewrite=False)
+
+def rewrite_history(chats: list[dict]) -> None:
+    """Replace the log with chats; a failed write leaves the old log, which still replays the same"""
+    try:
+        replace_bytes(HISTORY_FILE, history_bytes(chats))
+    except OSError as e:
+        print(f"Debug: Error rewriting chat history: {e}")
+
+def replay_history(rewrite: bool) -> list[dict]:
+    """Read the history log, migrating or compacting it in place if rewrite
+
+    With rewrite the caller must hold locked(HISTORY_FILE).
+    """
+    if not HISTORY_FILE.exists():
+        if LEGACY_HISTORY_FILE.exists():
+            # Migrate once so later appends don't shadow the old history
+            saved = load_legacy_saved_chats()
+            if rewrite:
+                rewrite_history(saved)
+            return saved
+        return []
+    chats: dict[str, dict] = {}
+    stale_lines = 0
+    try:
+        with HISTORY_FILE.open('rb') as fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                try:
+                    record = loads_json(line)
+                except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                    # A crash mid-append can leave a partial trailing line
+                    print(f"Debug: Skipping malformed chat history line: {e}")
+                    stale_lines += 1
+                    continue
+                if not isinstance(record, dict) or 'id' not in record:
+                    stale_lines += 1
+                    continue
+                if record['id'] in chats:
+                    stale_lines += 1
+                    del chats[record['id']]
+                if record.get('deleted'):
+                    stale_lines += 1
+                else:
+                    chats[record['id']] = record
+    except (FileNotFoundError, PermissionError) as e:
+        print(f"Debug: Error loading chat history: {e}")
+        return []
+    saved = list(reversed(chats.values()))
+    # Compact lazily once dead lines outnumber live chats
+    if rewrite and stale_lines > len(saved):
+        rewrite_history(saved)
+    return saved
+
+def load_saved_chats() -> list[dict]:
+    return _load_saved_chats_cached(file_mtime(HISTORY_FILE))
+
 def persist_saved_chats(chats: list[dict]) -> None:
-    HISTORY_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with HISTORY_FILE.open('w', encoding='utf-8') as fh:
-        json.dump(chats, fh, ensure_ascii=False, indent=2)
+    """Rewrite the whole history log; used for compaction and clearing"""
+    atomic_write_bytes(HISTORY_FILE, history_bytes(chats))
+    _load_saved_chats_cached.clear()
 
-def load_user_settings() -> dict:
+def append_chat(entry: dict) -> None:
+    """Append a single chat to the history log"""
+    line = dumps_json(entry) + b'\n'
+    with locked(HISTORY_FILE):
+        with HISTORY_FILE.open('ab') as fh:
+            fh.write(line)
+    _load_saved_chats_cached.clear()
+
+def delete_chat(chat_id: str) -> None:
+    """Record a deletion as a tombstone; it is dropped on the next compaction"""
+    append_chat({'id': chat_id, 'deleted': True})
+
+def build_chat_display(chats: list[dict]) -> list[tuple[dict, str]]:
+    """Sidebar rows for the ten most recent chats as (entry, truncated name)"""
+    return [
+        (entry, entry['name'][:30] + '...' if len(entry['name']) > 30 else entry['name'])
+        for entry in chats[:10]
+    ]
+
+@st.cache_data
+def _load_user_settings_cached(mtime: int) -> dict:
     if not SETTINGS_FILE.exists():
         return {}
     try:
-        with SETTINGS_FILE.open('r', encoding='utf-8') as fh:
-            return json.load(fh)
+        with SETTINGS_FILE.open('rb') as fh:
+            return loads_json(fh.read())
     except (json.JSONDecodeError, FileNotFoundError, PermissionError):
         return {}
 
+def load_user_settings() -> dict:
+    return _load_user_settings_cached(file_mtime(SETTINGS_FILE))
+
 def save_user_settings(settings: dict) -> None:
-    SETTINGS_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with SETTINGS_FILE.open('w', encoding='utf-8') as fh:
-        json.dump(settings, fh, ensure_ascii=False, indent=2)
+    atomic_write_bytes(SETTINGS_FILE, dumps_json(settings, indent=True))
+    _load_user_settings_cached.clear()
+
+@st.cache_resource
+def get_io_executor() -> ThreadPoolExecutor:
+    """Single worker so writes land in submission order; every history and settings write goes through it"""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix='cortex-io')
 
-def save_current_settings():
+def _log_io_error(future: Future) -> None:
+    if future.exception() is not None:
+        print(f"Debug: Background write failed: {future.exception()}")
+
+def submit_io(fn, *args) -> None:
+    """Run a fire-and-forget write off the script thread"""
+    get_io_executor().submit(fn, *args).add_done_callback(_log_io_error)
+
+def run_io(fn, *args):
+    """Run a write on the I/O worker and wait, so it can't overtake a queued background write"""
+    return get_io_executor().submit(fn, *args).result()
+
+def settings_digest(settings: dict) -> bytes:
+    return hashlib.blake2b(json.dumps(settings, sort_keys=True).encode(), digest_size=16).digest()
+
+def record_settings_save(settings: dict, digest: bytes, saved: dict) -> None:
+    """Write settings whose digest was already recorded in saved, forgetting it if the write fails
+
+    saved is a plain dict held in st.session_state, so the I/O worker can
+    update it without a script run context.
+    """
+    try:
+        save_user_settings(settings)
+    except Exception:
+        # Unless a newer save superseded it, let the next identical save retry
+        if saved.get('digest') == digest:
+            saved['digest'] = None
+        raise
+
+def save_current_settings(background: bool = False):
     """Save current session state settings to file"""
     current_settings = {
         'backend': st.session_state.backend,
         'model_name': st.session_state.model_name,
         'theme': getattr(st.session_state, 'theme', 'dark'),
+        'prefer_low_latency': st.session_state.prefer_low_latency,
         'profile_name': st.session_state.profile_name,
         'profile_email': st.session_state.profile_email,
         'profile_mobile': st.session_state.profile_mobile,
         'profile_address': st.session_state.profile_address,
     }
-    save_user_settings(current_settings)
+    # Rebuilt here, the only place the profile changes, rather than on every message
+    st.session_state.profile_context = build_profile_context(
+        current_settings['profile_name'], current_settings['profile_email'],
+        current_settings['profile_mobile'], current_settings['profile_address'],
+    )
+    # Skip the write when nothing changed since the last submitted save (e.g. re-selecting
+    # the same option); writes run in order, so that is what ends up on disk
+    settings_hash = settings_digest(current_settings)
+    saved = st.session_state.saved_settings_digest
+    if settings_hash == saved.get('digest'):
+        return
+    saved['digest'] = settings_hash
+    if background:
+        submit_io(record_settings_save, current_settings, settings_hash, saved)
+    else:
+        run_io(record_settings_save, current_settings, settings_hash, saved)
+
+def build_profile_context(name: str, email: str, mobile: str, address: str) -> str:
+    """Profile sentence sent to the model; kept per session in st.session_state.profile_context"""
+    if not any((name, email, mobile, address)):
+        return ""
+    profile_parts = []
+    if name:
+        profile_parts.append(f"My name is {name}")
+    if email:
+        profile_parts.append(f"my email is {email}")
+    if mobile:
+        profile_parts.append(f"my phone number is {mobile}")
+    if address:
+        profile_parts.append(f"my address is {address}")
+    return f"User Profile: {', '.join(profile_parts)}. "
+
+@st.cache_resource
+def get_http_client():
+    """One persistent client (HTTP/2 when h2 is installed) so connections stay warm across reruns"""
+    options = {
+        'timeout': httpx.Timeout(60.0, connect=5.0),
+        'limits': httpx.Limits(max_keepalive_connections=4),
+    }
+    try:
+        return httpx.Client(http2=True, **options)
+    except ImportError:
+        # HTTP/2 needs the optional h2 package (httpx[http2])
+        print("Debug: h2 not installed, using HTTP/1.1")
+        return httpx.Client(**options)
+
+def chat_request_options(prefer_low_latency: bool) -> dict:
+    """Extra request fields; asks OpenRouter to route to the lowest-latency provider"""
+    if prefer_low_latency:
+        return {'provider': {'sort': 'latency'}}
+    return {}
+
+def approx_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)"""
+    return len(text) // 4
+
+@dataclass(slots=True)
+class Message:
+    """A chat turn; much smaller than a dict when kept for a whole conversation"""
+    role: str
+    content: str
+    tokens: int | None = None  # cached approx_tokens(content)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Message':
+        return cls(data['role'], data['content'])
+
+    def to_dict(self) -> dict:
+        """Plain role/content dict, used for persistence and the chat API"""
+        return {'role': self.role, 'content': self.content}
+
+def context_window(messages: list[Message], budget: int) -> list[dict]:
+    """Most recent messages fitting in budget tokens, oldest first, as role/content dicts
+
+    Token counts are cached on each message so they are computed once.
+    The latest message is always included.
+    """
+    selected = []
+    total = 0
+    for msg in reversed(messages):
+        if msg.tokens is None:
+            msg.tokens = approx_tokens(msg.content)
+        if selected and total + msg.tokens > budget:
+            break
+        total += msg.tokens
+        selected.append(msg.to_dict())
+    selected.reverse()
+    return selected
+
+def chat_headers(api_key: str) -> dict:
+    """Headers for one user submission; the idempotency key is shared by its retries"""
+    return {'Authorization': f'Bearer {api_key}', 'Idempotency-Key': str(uuid.uuid4())}
+
+def is_retriable_error(error: Exception) -> bool:
+    """Transient failures worth retrying: timeouts, transport errors and 5xx responses"""
+    if httpx_sse is not None and isinstance(error, httpx_sse.SSEError):
+        # Subclasses TransportError, but a reply that isn't an event stream won't become one on retry
+        return False
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, (httpx.TransportError, ConnectionError))
+
+def chat_payload(model: str, messages: list[dict], stream: bool, options: dict | None = None) -> dict:
+    return {'model': model, 'messages': messages, 'stream': stream, **(options or {})}
+
+class ChatReplyError(Exception):
+    """The API answered with an error event or with no text at all"""
+
+def send_chat_blocking(client, headers: dict, model: str, messages: list[dict], options: dict | None = None) -> str:
+    """Request a complete reply in a single response"""
+    response = client.post(
+        HACKCLUB_CHAT_URL,
+        headers=headers,
+        json=chat_payload(model, messages, False, options),
+    )
+    response.raise_for_status()
+    data = response.json()
+    try:
+        content = data['choices'][0]['message']['content']
+    except (KeyError, IndexError, TypeError):
+        return f"❌ Hack Club API: Unexpected response: {data}"
+    if not content:
+        raise ChatReplyError("Empty reply")
+    return content
+
+def iter_sse_data(response):
+    """Yield the data payload of each server-sent event in response"""
+    if httpx_sse is not None:
+        for event in httpx_sse.EventSource(response).iter_sse():
+            yield event.data
+        return
+    # Minimal fallback: single-line data fields only
+    for line in response.iter_lines():
+        if line.startswith('data:'):
+            yield line[5:].strip()
+
+def iter_chat_deltas(client, headers: dict, model: str, messages: list[dict], options: dict | None = None):
+    """Yield content deltas from the server-sent event stream of a completion"""
+    with client.stream(
+        'POST',
+        HACKCLUB_CHAT_URL,
+        headers=headers,
+        json=chat_payload(model, messages, True, options),
+    ) as response:
+        response.raise_for_status()
+        for data in iter_sse_data(response):
+            if data == '[DONE]':
+                break
+            if not data:
+                continue
+            chunk = loads_json(data)
+            # OpenRouter reports failures after the 200 status as an error event
+            error = chunk.get('error')
+            if error:
+                raise ChatReplyError(error.get('message', error) if isinstance(error, dict) else error)
+            choices = chunk.get('choices')
+            if choices:
+                delta = (choices[0].get('delta') or {}).get('content')
+                if delta:
+                    yield delta
+
+def stream_chat(client, headers: dict, model: str, messages: list[dict], placeholder,
+                options: dict | None = None, min_batch: int = 1, growth: int = 3, max_batch: int = 50,
+                flush_interval: float = 0.08) -> str:
+    """Stream a reply into placeholder, falling back to a blocking request if the stream fails
+
+    Transient failures before any text arrives are retried with exponential
+    backoff; 4xx responses are reported straight away. The returned text is
+    always left painted in placeholder.
+    """
+    full_response = ''
+    # Repaint after a growing number of chunks (or flush_interval seconds)
+    # so UI updates track the token rate rather than the token count
+    pending = 0
+    batch = min_batch
+    last_flush = time.monotonic()
+    for attempt in range(CHAT_RETRIES):
+        try:
+            for delta in iter_chat_deltas(client, headers, model, messages, options):
+                full_response += delta
+                pending += 1
+                if pending >= batch or time.monotonic() - last_flush > flush_interval:
+                    placeholder.markdown(full_response)
+                    pending = 0
+                    batch = min(max_batch, batch * growth)
+                    last_flush = time.monotonic()
+            if not full_response:
+                raise ChatReplyError("Empty reply stream")
+            break
+        except Exception as e:
+            retriable = is_retriable_error(e)
+            # Retrying after text has arrived would duplicate it
+            if retriable and not full_response and attempt < CHAT_RETRIES - 1:
+                time.sleep(CHAT_RETRY_DELAY * 2**attempt)
+                continue
+            if full_response:
+                full_response = f"{full_response}\n\n❌ Hack Club API error: {type(e).__name__}: {str(e)}"
+            elif retriable or isinstance(e, httpx.HTTPStatusError):
+                # A blocking request would hit the same 4xx (bad key, bad request, rate limit)
+                full_response = f"❌ Hack Club API error: {type(e).__name__}: {str(e)}"
+            else:
+                # The stream itself failed; its body differs, so it gets its own idempotency key
+                fallback_headers = {**headers, 'Idempotency-Key': str(uuid.uuid4())}
+                try:
+                    full_response = send_chat_blocking(client, fallback_headers, model, messages, options)
+                except Exception as e:
+                    full_response = f"❌ Hack Club API error: {type(e).__name__}: {str(e)}"
+            pending = 1
+            break
+    # Only repaint if the last batch hasn't been shown yet
+    if pending:
+        placeholder.markdown(full_response)
+    return full_response
 
 def lemniscate(t, a=1.0):
     # Bernoulli lemniscate parametric form
-    denom = 1 + np.sin(t)**2
-    x = a * np.cos(t) / denom
-    y = a * np.sin(t) * np.cos(t) / denom
-    return np.vstack((x, y)).T
+    s = np.sin(t)
+    c = np.cos(t)
+    inv = a / (1.0 + s*s)
+    return np.column_stack((c*inv, s*c*inv))
 
 def unit_normals(points):
-    # compute tangent and normals for a polyline
+    # compute unit tangents for a polyline in place
     diffs = np.diff(points, axis=0)
-    tangents = diffs / np.linalg.norm(diffs, axis=1)[:, None]
-    # for last point, repeat last tangent
-    tangents = np.vstack((tangents, tangents[-1]))
-    normals = np.column_stack((-tangents[:,1], tangents[:,0]))
-    # normalize normals
-    normals = normals / np.linalg.norm(normals, axis=1)[:, None]
+    np.divide(diffs, np.linalg.norm(diffs, axis=1, keepdims=True), out=diffs)
+    # rotating a unit tangent by 90 degrees already yields a unit normal
+    normals = np.empty_like(points)
+    normals[:-1,0] = -diffs[:,1]
+    normals[:-1,1] = diffs[:,0]
+    # for last point, repeat last normal
+    normals[-1] = normals[-2]
     return normals
 
 def build_ribbon(points, width=0.18, n_segments=200):
     normals = unit_normals(points)
     left = points + normals * (width/2)
     right = points - normals * (width/2)
-    # build polygon strips per segment for gradient coloring
-    polys = []
+    # build polygon strips per segment for gradient coloring, shape (N-1, 4, 2)
+    quads = np.stack((left[:-1], left[1:], right[1:], right[:-1]), axis=1)
     tvals = np.linspace(0, 1, len(points), False)
-    for i in range(len(points)-1):
-        quad = np.array([ left[i], left[i+1], right[i+1], right[i] ])
-        polys.append((quad, tvals[i]))
-    return polys
+    return quads, tvals[:-1]
 
 def plot_rainbow_ribbon(ax, polys, cmap_name='hsv'):
-    cmap = plt.colormaps.get_cmap(cmap_name)
-    verts = [p[0] for p in polys]
-    tvals = np.array([p[1] for p in polys])
+    cmap = matplotlib.colormaps.get_cmap(cmap_name)
+    verts, tvals = polys
     # color by t along the path
     colors = cmap(tvals)
     coll = PolyCollection(verts, facecolors=colors, edgecolors='none', linewidths=0)
     ax.add_collection(coll)
 
-def generate_logo_base64():
+def generate_logo_png() -> bytes:
     # parameter t
-    t = np.linspace(0, 2*np.pi, 600, False)
-    pts = lemniscate(t, a=1.2)
+    t = np.linspace(0, 2*np.pi, LOGO_PARAMS['samples'], False)
+    pts = lemniscate(t, a=LOGO_PARAMS['scale'])
 
     # rotate and scale a bit to match aesthetic
-    theta = np.deg2rad(-20)
-    R = np.array([[np.cos(theta), -np.sin(theta)],
-                  [np.sin(theta),  np.cos(theta)]])
-    pts = pts.dot(R.T)
+    theta = np.deg2rad(LOGO_PARAMS['rotation'])
+    z = pts[:,0] + 1j*pts[:,1]
+    z *= np.exp(1j*theta)
+    pts = np.column_stack((z.real, z.imag))
 
     # build ribbon polygons
-    polys = build_ribbon(pts, width=0.45)
+    polys = build_ribbon(pts, width=LOGO_PARAMS['width'])
 
     # plotting
-    fig, ax = plt.subplots(figsize=(2,2), dpi=150)
+    # 64x64 px: 2x the 32px avatar size for HiDPI displays
+    # Use the object API so no figure is registered in pyplot's global state
+    fig = Figure(figsize=(1,1), dpi=LOGO_PARAMS['dpi'])
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
     plot_rainbow_ribbon(ax, polys, cmap_name='hsv')
 
     # add a subtle inner highlight (thin white stroke along center)
     center_x = pts[:,0]
     center_y = pts[:,1]
-    ax.plot(center_x, center_y, color=(1,1,1,0.18), linewidth=6, solid_capstyle='round')
+    ax.plot(center_x, center_y, color=(1,1,1,0.18), linewidth=3, solid_capstyle='round')
 
     # add a soft darker shadow underneath (offset and blurred look via alpha)
     shadow = pts + np.array([0.06, -0.06])
-    ax.plot(shadow[:,0], shadow[:,1], color=(0,0,0,0.12), linewidth=18, solid_capstyle='round')
+    ax.plot(shadow[:,0], shadow[:,1], color=(0,0,0,0.12), linewidth=9, solid_capstyle='round')
 
     ax.set_aspect('equal')
     ax.axis('off')
     # tight margins
-    plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
+    fig.subplots_adjust(left=0, right=1, top=1, bottom=0)
     
-    # Save to base64
+    # Save to PNG bytes; the axes already fill the figure, so skip the
+    # extra render pass that bbox_inches='tight' would need to measure it
     buf = io.BytesIO()
-    plt.savefig(buf, format='png', transparent=True, bbox_inches='tight', pad_inches=0)
-    buf.seek(0)
-    img_base64 = base64.b64encode(buf.getvalue()).decode()
-    plt.close()
+    fig.savefig(buf, format='png', transparent=True)
     
-    return img_base64
+    return buf.getvalue()
+
+@st.cache_resource
+def get_logo_png() -> bytes:
+    """Load the logo from the static folder, generating and persisting it on first run"""
+    if LOGO_FILE.exists():
+        try:
+            return LOGO_FILE.read_bytes()
+        except OSError as e:
+            print(f"Debug: Error loading cached logo: {e}")
+    logo_png = generate_logo_png()
+    # Unique temp name so processes starting together never share a partial file;
+    # a truncated logo would otherwise be served for as long as LOGO_PARAMS is unchanged
+    tmp_path = LOGO_FILE.with_name(f"{LOGO_FILE.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        LOGO_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with tmp_path.open('wb') as fh:
+            fh.write(logo_png)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, LOGO_FILE)
+    except OSError as e:
+        print(f"Debug: Error caching logo: {e}")
+        tmp_path.unlink(missing_ok=True)
+    return logo_png
+
+@st.cache_resource
+def get_logo_base64() -> str:
+    return base64.b64encode(get_logo_png()).decode()
+
+@st.cache_resource
+def get_logo_url() -> str:
+    return f"data:image/png;base64,{get_logo_base64()}"
+
+@st.cache_resource
+def get_logo_css_url() -> str:
+    """Static URL for the logo, or the data URL if it couldn't be written to the static folder"""
+    get_logo_png()
+    if LOGO_FILE.exists():
+        return f"./app/static/{LOGO_FILE.name}"
+    return get_logo_url()
 
-# Generate logo once
-LOGO_BASE64 = generate_logo_base64()
-LOGO_URL = f"data:image/png;base64,{LOGO_BASE64}"
+# Generate logo once; passed to st.chat_message as bytes so avatars get a short media URL
+LOGO_PNG = get_logo_png()
 
 def get_theme_styles(theme='dark'):
     """Get theme-specific CSS styles"""
@@ -399,7 +890,7 @@ section[data-testid="stSidebar"] .stButton button:hover {
     display: inline-block;
     width: 32px;
     height: 32px;
-    background-image: url("data:image/png;base64,''' + LOGO_BASE64 + '''");
+    background-image: var(--logo);
     background-size: contain;
     background-repeat: no-repeat;
     background-position: center;
@@ -411,7 +902,7 @@ section[data-testid="stSidebar"] .stButton button:hover {
     display: inline-block;
     width: 32px;
     height: 32px;
-    background-image: url("data:image/png;base64,''' + LOGO_BASE64 + '''");
+    background-image: var(--logo);
     background-size: contain;
     background-repeat: no-repeat;
     background-position: center;
@@ -537,23 +1028,23 @@ button[data-testid="stSidebarNavCollapseButton"]:hover {
     background: rgba(99, 102, 241, 0.25) !important;
 }
 '''
-_SEND_MESSAGE_STYLE = f'''
-.stChatInput textarea {{
-    background-image: url("data:image/png;base64,{LOGO_BASE64}") !important;
+_SEND_MESSAGE_STYLE = '''
+.stChatInput textarea {
+    background-image: var(--logo) !important;
     background-repeat: no-repeat !important;
     background-position: 16px center !important;
     background-size: 28px 28px !important;
     padding-left: 3.5rem !important;
     padding-right: 5.5rem !important;
-}}.
-stChatInput textarea::placeholder {{
+}.
+stChatInput textarea::placeholder {
     color: rgba(226, 232, 240, 0.85) !important;
-}}
+}
 /* Drag and drop styling */
-.chat-input-container {{
+.chat-input-container {
     position: relative !important;
-}}
-.drag-overlay {{
+}
+.drag-overlay {
     position: absolute !important;
     top: 0 !important;
     left: 0 !important;
@@ -567,30 +1058,87 @@ stChatInput textarea::placeholder {{
     justify-content: center !important;
     z-index: 10002 !important;
     pointer-events: none !important;
-}}
-.drag-overlay.drag-active {{
+}
+.drag-overlay.drag-active {
     display: flex !important;
-}}
-.drag-overlay-text {{
+}
+.drag-overlay-text {
     color: #8b5cf6 !important;
     font-size: 1.1rem !important;
     font-weight: 500 !important;
-}}
-.stChatInput {{
+}
+.stChatInput {
     transition: all 0.3s ease !important;
-}}
-.stChatInput.drag-over {{
+}
+.stChatInput.drag-over {
     background: rgba(99, 102, 241, 0.05) !important;
     border-color: rgba(99, 102, 241, 0.6) !important;
     transform: scale(1.01) !important;
-}}
+}
 '''
 
+@st.cache_resource(max_entries=4)
+def get_stylesheet(theme: str) -> str:
+    """Build the full <style> block once per theme"""
+    # Logo served as a static file, shared by every rule that uses it
+    logo_rule = f":root {{ --logo: url('{get_logo_css_url()}'); }}"
+    return f"<style>{logo_rule}{get_theme_styles(theme)}{_STYLE}{_SEND_MESSAGE_STYLE}</style>"
+
+@st.cache_resource
+def get_top_header_html() -> str:
+    """Header markup, built once per process"""
+    return f"""
+    <div class='top-header'>
+        <div style='display: flex; align-items: center; gap: 0.75rem;'>
+            <div class='logo-container'>
+                <img src="{get_logo_css_url()}" 
+                     alt="Cortex AI Logo" 
+                     style="width: 40px; height: 40px; border-radius: 8px;"/>
+            </div>
+            <h1>Cortex Ai</h1>
+        </div>
+    </div>
+    """
+
+EMPTY_STATE_SECTIONS = [
+    ('💡', 'Examples', [
+        'Explain quantum computing in simple terms',
+        "Got any creative ideas for a 10 year old's birthday?",
+        'How do I write a Javascript fetch request?',
+    ]),
+    ('⚡', 'Capabilities', [
+        'Remembers what user said earlier in the conversation',
+        'Allows user to provide follow-up corrections',
+        'Trained to decline inappropriate requests',
+    ]),
+    ('⚠️', 'Limitations', [
+        'May occasionally generate incorrect information',
+        'May occasionally produce harmful instructions',
+        'Limited knowledge of world and events after 2021',
+    ]),
+]
+
+@st.cache_resource
+def get_empty_state_html() -> str:
+    """Three-column examples/capabilities/limitations panel as a single HTML block"""
+    columns = []
+    for icon, heading, items in EMPTY_STATE_SECTIONS:
+        cards = ''.join(
+            f"<div class='example-card'><p style='margin:0; color:#c7d2fe; font-size: 0.95rem;'>{item}</p></div>"
+            for item in items
+        )
+        columns.append(
+            f"<div style='flex: 1 1 220px; min-width: 0;'>"
+            f"<h3 style='color:#e2e8f0; margin-bottom: 1rem;'>{icon} {heading}</h3>{cards}</div>"
+        )
+    return f"<div style='display: flex; flex-wrap: wrap; gap: 1rem;'>{''.join(columns)}</div>"
+
 # Initialize session state first
 if 'messages' not in st.session_state:
     st.session_state.messages = []
 if 'saved_chats' not in st.session_state:
     st.session_state.saved_chats = load_saved_chats()
+    st.session_state.chat_display = build_chat_display(st.session_state.saved_chats)
 if 'chat_title_input' not in st.session_state:
     st.session_state.chat_title_input = 'New chat'
 if 'uploaded_files' not in st.session_state:
@@ -602,6 +1150,8 @@ if 'rename_input' not in st.session_state:
 
 # Load saved user settings
 saved_settings = load_user_settings()
+if 'saved_settings_digest' not in st.session_state:
+    st.session_state.saved_settings_digest = {'digest': settings_digest(saved_settings)}
 
 if 'backend' not in st.session_state:
     st.session_state.backend = saved_settings.get('backend', 'hackclub')
@@ -609,6 +1159,8 @@ if 'model_name' not in st.session_state:
     st.session_state.model_name = saved_settings.get('model_name', 'hackclub/model1')
 if 'theme' not in st.session_state:
     st.session_state.theme = saved_settings.get('theme', 'dark')
+if 'prefer_low_latency' not in st.session_state:
+    st.session_state.prefer_low_latency = saved_settings.get('prefer_low_latency', False)
 
 if 'show_settings' not in st.session_state:
     st.session_state.show_settings = False
@@ -622,9 +1174,13 @@ if 'profile_email' not in st.session_state:
     st.session_state.profile_email = saved_settings.get('profile_email', '')
 if 'profile_address' not in st.session_state:
     st.session_state.profile_address = saved_settings.get('profile_address', '')
+if 'profile_context' not in st.session_state:
+    st.session_state.profile_context = build_profile_context(
+        *(st.session_state[key] for key in ('profile_name', 'profile_email', 'profile_mobile', 'profile_address'))
+    )
 
 # Apply styles after session state is initialized
-st.markdown(f"<style>{get_theme_styles(st.session_state.theme)}{_STYLE}{_SEND_MESSAGE_STYLE}</style>", unsafe_allow_html=True)
+st.markdown(get_stylesheet(st.session_state.theme), unsafe_allow_html=True)
 
 with st.sidebar:
     # Conversations section
@@ -640,10 +1196,14 @@ with st.sidebar:
                 'timestamp': datetime.now(UTC).isoformat(),
                 'model': st.session_state.model_name,
                 'backend': st.session_state.backend,
-                'messages': [message.copy() for message in st.session_state.messages],
+                # Converted rather than taking over the live list: saved chats hold the
+                # same JSON-ready dicts as those replayed from disk, and this runs once
+                # per click rather than on every rerun
+                'messages': [message.to_dict() for message in st.session_state.messages],
             }
             st.session_state.saved_chats.insert(0, entry)
-            persist_saved_chats(st.session_state.saved_chats)
+            st.session_state.chat_display = build_chat_display(st.session_state.saved_chats)
+            run_io(append_chat, entry)
         
         # Clear current conversation
         st.session_state.messages = []
@@ -653,15 +1213,14 @@ with st.sidebar:
     
     # Show saved chats
     if st.session_state.saved_chats:
-        for entry in st.session_state.saved_chats[:10]:
-            chat_name = entry['name'][:30] + '...' if len(entry['name']) > 30 else entry['name']
-            
+        for entry, chat_name in st.session_state.chat_display:
             # Create columns for chat button and delete button
             col1, col2 = st.columns([4, 1])
             
             with col1:
                 if st.button(chat_name, key=f"chat-{entry['id']}", use_container_width=True):
-                    st.session_state.messages = [message.copy() for message in entry['messages']]
+                    # One pass per click to the slotted form kept for the rest of the session
+                    st.session_state.messages = [Message.from_dict(message) for message in entry['messages']]
                     st.session_state.selected_chat_id = entry['id']
                     st.session_state.rename_input = entry['name']
                     st.rerun()
@@ -670,7 +1229,8 @@ with st.sidebar:
                 if st.button('🗑️', key=f"delete-{entry['id']}", help=f"Delete '{chat_name}'"):
                     # Remove the chat from saved_chats
                     st.session_state.saved_chats = [chat for chat in st.session_state.saved_chats if chat['id'] != entry['id']]
-                    persist_saved_chats(st.session_state.saved_chats)
+                    st.session_state.chat_display = build_chat_display(st.session_state.saved_chats)
+                    run_io(delete_chat, entry['id'])
                     
                     # Clear current messages if this was the selected chat
                     if st.session_state.selected_chat_id == entry['id']:
@@ -729,27 +1289,19 @@ if st.session_state.show_settings:
             
             st.markdown("### Personal Information")
             
-            # Profile input fields with change detection
+            # Profile input fields; changes are saved explicitly below
             new_name = st.text_input('Full Name', value=st.session_state.profile_name, placeholder='Enter your full name', key="profile_name_input")
             new_mobile = st.text_input('Mobile Number', value=st.session_state.profile_mobile, placeholder='Enter your mobile number', key="profile_mobile_input")
             new_email = st.text_input('Email Address', value=st.session_state.profile_email, placeholder='Enter your email address', key="profile_email_input")
             new_address = st.text_area('Address', value=st.session_state.profile_address, placeholder='Enter your address', height=100, key="profile_address_input")
             
-            # Check for changes and save if needed
-            if (new_name != st.session_state.profile_name or 
-                new_mobile != st.session_state.profile_mobile or 
-                new_email != st.session_state.profile_email or 
-                new_address != st.session_state.profile_address):
-                
+            # Only write on an explicit save, not on every keystroke-triggered rerun
+            if st.button("💾 Save Profile", use_container_width=True):
                 st.session_state.profile_name = new_name
                 st.session_state.profile_mobile = new_mobile
                 st.session_state.profile_email = new_email
                 st.session_state.profile_address = new_address
                 save_current_settings()
-                
-            # Save button for manual save
-            if st.button("💾 Save Profile", use_container_width=True):
-                save_current_settings()
                 st.success("✅ Profile saved successfully!")
         
         elif st.session_state.settings_page == "security":
@@ -795,33 +1347,38 @@ if st.session_state.show_settings:
             # Backend configuration
             st.markdown("### AI Model Configuration")
             st.markdown("### Hack Club Models")
-            hc_models = {
-                'hackclub/model1': '🔧 Hack Club Model 1',
-                'hackclub/model2': '🔨 Hack Club Model 2'
-            }
-            hc_keys = list(hc_models.keys())
-            hc_labels = list(hc_models.values())
             current_index = 0
-            if st.session_state.model_name in hc_keys:
-                current_index = hc_keys.index(st.session_state.model_name)
+            if st.session_state.model_name in HC_KEYS:
+                current_index = HC_KEYS.index(st.session_state.model_name)
             selected_label = st.radio(
                 'Select Hack Club Model',
-                hc_labels,
+                HC_LABELS,
                 index=current_index,
                 key="hc_model_selection",
                 horizontal=True
             )
-            selected_index = hc_labels.index(selected_label)
-            new_model = hc_keys[selected_index]
+            selected_index = HC_LABELS.index(selected_label)
+            new_model = HC_KEYS[selected_index]
             if new_model != st.session_state.model_name:
                 st.session_state.model_name = new_model
-                save_current_settings()
+                save_current_settings(background=True)
+
+            new_prefer_low_latency = st.checkbox(
+                'Prefer fastest provider',
+                value=st.session_state.prefer_low_latency,
+                help='Route requests to the provider with the lowest latency; may affect cost or quality',
+                key="prefer_low_latency_toggle"
+            )
+            if new_prefer_low_latency != st.session_state.prefer_low_latency:
+                st.session_state.prefer_low_latency = new_prefer_low_latency
+                save_current_settings(background=True)
 
             st.markdown("---")
             st.markdown("### Conversation Management")
             if st.button('🗑️ Clear all conversations', use_container_width=True):
                 st.session_state.saved_chats = []
-                persist_saved_chats([])
+                st.session_state.chat_display = []
+                submit_io(persist_saved_chats, [])
                 st.session_state.messages = []
                 st.session_state.selected_chat_id = None
                 st.success('All conversations cleared!')
@@ -836,120 +1393,58 @@ elif not st.session_state.show_settings:
     # Regular chat interface
     
     # Fixed top-left header with logo and title
-    st.markdown(f"""
-    <div class='top-header'>
-        <div style='display: flex; align-items: center; gap: 0.75rem;'>
-            <div class='logo-container'>
-                <img src="data:image/png;base64,{LOGO_BASE64}" 
-                     alt="Cortex AI Logo" 
-                     style="width: 40px; height: 40px; border-radius: 8px;"/>
-            </div>
-            <h1>Cortex Ai</h1>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(get_top_header_html(), unsafe_allow_html=True)
 
+    # Each markdown element is closed on its own, so these wrappers only act as
+    # spacers; emit them together and skip the separate closing-tag elements
     with st.container():
-        st.markdown("<div class='main-container'>", unsafe_allow_html=True)
-        st.markdown("<div class='main-content'>", unsafe_allow_html=True)
+        st.markdown("<div class='main-container'><div class='main-content'></div></div>", unsafe_allow_html=True)
 
-    # Chat input
-    if prompt := st.chat_input('Send a message'):
-        st.session_state.messages.append({'role': 'user', 'content': prompt})
+    # Chat input (read first so a pending prompt hides the empty state)
+    prompt = st.chat_input('Send a message')
+
+    # Display chat messages
+    if st.session_state.messages or prompt:
+        st.markdown("<div style='margin: 1.5rem 0;'></div>", unsafe_allow_html=True)
+        for message in st.session_state.messages:
+            st.chat_message(message.role, avatar=LOGO_PNG).markdown(message.content)
+    else:
+        # Examples, Capabilities, Limitations cards - only show when no messages
+        st.markdown(get_empty_state_html(), unsafe_allow_html=True)
+
+    # Answer the new prompt, streaming the reply below the history
+    if prompt:
+        with st.chat_message('user', avatar=LOGO_PNG):
+            st.markdown(prompt)
+        st.session_state.messages.append(Message('user', prompt))
         # Build context with profile information
-        profile_context = ""
-        if (st.session_state.profile_name or st.session_state.profile_email or 
-            st.session_state.profile_mobile or st.session_state.profile_address):
-            profile_parts = []
-            if st.session_state.profile_name:
-                profile_parts.append(f"My name is {st.session_state.profile_name}")
-            if st.session_state.profile_email:
-                profile_parts.append(f"my email is {st.session_state.profile_email}")
-            if st.session_state.profile_mobile:
-                profile_parts.append(f"my phone number is {st.session_state.profile_mobile}")
-            if st.session_state.profile_address:
-                profile_parts.append(f"my address is {st.session_state.profile_address}")
-            profile_context = f"User Profile: {', '.join(profile_parts)}. "
-        # Prepare messages with profile context for AI
-        messages_for_ai = st.session_state.messages.copy()
+        profile_context = st.session_state.profile_context
+        # Prepare messages with profile context for AI, capped by a token budget
         if profile_context:
             # Add profile context as a system message at the beginning
             system_message = {
                 'role': 'system', 
                 'content': f"{profile_context}Please use this information when relevant to provide personalized responses."
             }
-            messages_for_ai = [system_message] + messages_for_ai[-3:]  # System + last 3 messages
-        else:
-            messages_for_ai = messages_for_ai[-3:]  # Just last 3 messages
-        full_response = ''
-        try:
-            from openrouter import OpenRouter
-        except ImportError:
-            OpenRouter = None
-        if OpenRouter is None:
-            full_response = "⚠️ openrouter library not installed. Run: pip install openrouter"
+            budget = CONTEXT_TOKEN_BUDGET - approx_tokens(system_message['content'])
+            messages_for_ai = [system_message, *context_window(st.session_state.messages, budget)]
         else:
-            api_key = get_hackclub_api_key()
-            if not api_key:
-                full_response = "⚠️ Hack Club API key not configured. Set the HACKCLUB_API_KEY environment variable."
+            messages_for_ai = context_window(st.session_state.messages, CONTEXT_TOKEN_BUDGET)
+        with st.chat_message('assistant', avatar=LOGO_PNG):
+            placeholder = st.empty()
+            if httpx is None:
+                full_response = "⚠️ httpx library not installed. Run: pip install 'httpx[http2]'"
+                placeholder.markdown(full_response)
             else:
-                client = OpenRouter(
-                    api_key=api_key,
-                    server_url="https://ai.hackclub.com/proxy/v1"
-                )
-                formatted_messages = []
-                for msg in messages_for_ai:
-                    formatted_messages.append({
-                        "role": msg["role"],
-                        "content": msg["content"]
-                    })
-                try:
-                    response = client.chat.send(
-                        model=st.session_state.model_name,
-                        messages=formatted_messages,
-                        stream=False
-                    )
-                    if hasattr(response, 'choices') and response.choices and hasattr(response.choices[0], 'message'):
-                        full_response = response.choices[0].message.content
-                    else:
-                        full_response = f"❌ Hack Club API: Unexpected response: {response}"
-                except Exception as e:
-                    full_response = f"❌ Hack Club API error: {type(e).__name__}: {str(e)}"
-        # Always append assistant response to messages
-        st.session_state.messages.append({'role': 'assistant', 'content': full_response})
-        st.rerun()
-
-    # Display chat messages
-    if st.session_state.messages:
-        st.markdown("<div style='margin: 1.5rem 0;'>", unsafe_allow_html=True)
-        for message in st.session_state.messages:
-            with st.chat_message(message['role'], avatar=LOGO_URL):
-                st.markdown(message['content'])
-        st.markdown('</div>', unsafe_allow_html=True)
-    else:
-        # Examples, Capabilities, Limitations cards - only show when no messages
-        columns = st.columns(3)
-        examples = [
-            'Explain quantum computing in simple terms',
-            "Got any creative ideas for a 10 year old's birthday?",
-            'How do I write a Javascript fetch request?',
-        ]
-        capabilities = [
-            'Remembers what user said earlier in the conversation',
-            'Allows user to provide follow-up corrections',
-            'Trained to decline inappropriate requests',
-        ]
-        limitations = [
-            'May occasionally generate incorrect information',
-            'May occasionally produce harmful instructions',
-            'Limited knowledge of world and events after 2021',
-        ]
-
-        icons = ['💡', '⚡', '⚠️']
-        for col, heading, items, icon in zip(columns, ['Examples', 'Capabilities', 'Limitations'], [examples, capabilities, limitations], icons):
-            with col:
-                st.markdown(f"<h3 style='color:#e2e8f0; margin-bottom: 1rem;'>{icon} {heading}</h3>", unsafe_allow_html=True)
-                for item in items:
-                    st.markdown(f"<div class='example-card'><p style='margin:0; color:#c7d2fe; font-size: 0.95rem;'>{item}</p></div>", unsafe_allow_html=True)
-
-    st.markdown('</div>', unsafe_allow_html=True)
+                api_key = get_hackclub_api_key()
+                if not api_key:
+                    full_response = "⚠️ Hack Club API key not configured. Set the HACKCLUB_API_KEY environment variable."
+                    placeholder.markdown(full_response)
+                else:
+                    client = get_http_client()
+                    headers = chat_headers(api_key)
+                    options = chat_request_options(st.session_state.prefer_low_latency)
+                    full_response = stream_chat(client, headers, st.session_state.model_name, messages_for_ai, placeholder, options)
+        # Always append assistant response to messages; the reply is already
+        # painted, so no rerun is needed
+        st.session_state.messages.append(Message('assistant', full_response))
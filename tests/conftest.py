@@ -0,0 +1,23 @@
+import importlib.util
+import shutil
+from pathlib import Path
+
+import pytest
+
+APP_FILE = Path(__file__).resolve().parents[1] / 'AI.py'
+
+
+@pytest.fixture(scope='session')
+def ai(tmp_path_factory):
+    """The app module, imported from a copy in a temp directory
+
+    Importing runs the whole Streamlit script, and its history, settings and
+    logo files live next to AI.py, so the copy keeps the checkout untouched.
+    """
+    pytest.importorskip('streamlit')
+    app_dir = tmp_path_factory.mktemp('app')
+    shutil.copy(APP_FILE, app_dir / 'AI.py')
+    spec = importlib.util.spec_from_file_location('AI', app_dir / 'AI.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
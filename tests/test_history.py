@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def history(ai, tmp_path, monkeypatch):
+    monkeypatch.setattr(ai, 'HISTORY_FILE', tmp_path / 'chat_history.jsonl')
+    monkeypatch.setattr(ai, 'LEGACY_HISTORY_FILE', tmp_path / 'chat_history.json')
+    ai._load_saved_chats_cached.clear()
+    yield ai.HISTORY_FILE
+    ai._load_saved_chats_cached.clear()
+
+
+def chat(chat_id, name=None):
+    return {'id': chat_id, 'name': name or chat_id, 'messages': [{'role': 'user', 'content': chat_id}]}
+
+
+def log_lines(path):
+    return [json.loads(line) for line in path.read_bytes().splitlines()]
+
+
+def test_replay_is_newest_first_and_resaves_move_to_top(ai, history):
+    for chat_id in ('a', 'b', 'c'):
+        ai.append_chat(chat(chat_id))
+    ai.append_chat(chat('a', 'renamed'))
+
+    assert [(c['id'], c['name']) for c in ai.load_saved_chats()] == [('a', 'renamed'), ('c', 'c'), ('b', 'b')]
+
+
+def test_tombstone_removes_chat(ai, history):
+    ai.append_chat(chat('a'))
+    ai.append_chat(chat('b'))
+    ai.delete_chat('a')
+
+    assert [c['id'] for c in ai.load_saved_chats()] == ['b']
+
+
+def test_compacts_once_stale_lines_outnumber_live_chats(ai, history):
+    ai.append_chat(chat('a'))
+    ai.append_chat(chat('b'))
+    ai.delete_chat('a')
+    # Two stale lines (a and its tombstone) against one live chat
+    assert [c['id'] for c in ai.load_saved_chats()] == ['b']
+    assert log_lines(history) == [chat('b')]
+
+
+def test_does_not_compact_at_threshold(ai, history):
+    ai.append_chat(chat('a'))
+    ai.append_chat(chat('b'))
+    ai.append_chat(chat('a'))
+    # One stale line against two live chats
+    assert [c['id'] for c in ai.load_saved_chats()] == ['a', 'b']
+    assert len(log_lines(history)) == 3
+
+
+def test_skips_malformed_trailing_line(ai, history):
+    ai.append_chat(chat('a'))
+    ai.append_chat(chat('b'))
+    with history.open('ab') as fh:
+        fh.write(b'{"id": "c", "name"')
+
+    assert [c['id'] for c in ai.load_saved_chats()] == ['b', 'a']
+
+
+def test_migrates_legacy_json_history(ai, history):
+    legacy = [chat('new'), chat('old')]
+    ai.LEGACY_HISTORY_FILE.write_text(json.dumps(legacy))
+
+    assert ai.load_saved_chats() == legacy
+    # Stored oldest first, so later appends replay on top of it
+    assert log_lines(history) == [chat('old'), chat('new')]
+    ai.append_chat(chat('newest'))
+    assert [c['id'] for c in ai.load_saved_chats()] == ['newest', 'new', 'old']
@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+httpx = pytest.importorskip('httpx')
+pytest.importorskip('httpx_sse')
+
+
+class Placeholder:
+    def __init__(self):
+        self.text = None
+
+    def markdown(self, text):
+        self.text = text
+
+
+def make_client(handler):
+    return httpx.Client(transport=httpx.MockTransport(handler))
+
+
+def completion(content):
+    return {'choices': [{'message': {'role': 'assistant', 'content': content}}]}
+
+
+def event_stream(*events):
+    body = ''.join(f'data: {event}\n\n' for event in events)
+    return httpx.Response(200, headers={'Content-Type': 'text/event-stream'}, content=body.encode())
+
+
+def test_error_event_falls_back_to_blocking(ai, monkeypatch):
+    monkeypatch.setattr(ai, 'CHAT_RETRY_DELAY', 0)
+
+    def handler(request):
+        if json.loads(request.content)['stream']:
+            return event_stream(json.dumps({'error': {'message': 'Provider returned error'}}))
+        return httpx.Response(200, json=completion('Recovered'))
+
+    placeholder = Placeholder()
+    with make_client(handler) as client:
+        reply = ai.stream_chat(client, ai.chat_headers('key'), 'model',
+                               [{'role': 'user', 'content': 'Hi'}], placeholder)
+
+    assert reply == 'Recovered'
+    assert placeholder.text == 'Recovered'
+
+
+def test_empty_reply_is_reported(ai, monkeypatch):
+    monkeypatch.setattr(ai, 'CHAT_RETRY_DELAY', 0)
+
+    def handler(request):
+        if json.loads(request.content)['stream']:
+            return event_stream('[DONE]')
+        return httpx.Response(200, json=completion(''))
+
+    placeholder = Placeholder()
+    with make_client(handler) as client:
+        reply = ai.stream_chat(client, ai.chat_headers('key'), 'model',
+                               [{'role': 'user', 'content': 'Hi'}], placeholder)
+
+    assert reply == '❌ Hack Club API error: ChatReplyError: Empty reply'
+    assert placeholder.text == reply
+
+
+def test_json_reply_to_stream_request_falls_back_to_blocking(ai, monkeypatch):
+    monkeypatch.setattr(ai, 'CHAT_RETRY_DELAY', 0)
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        # Some providers ignore stream=True and answer with a plain JSON body
+        return httpx.Response(200, json=completion('Hello!'))
+
+    placeholder = Placeholder()
+    with make_client(handler) as client:
+        reply = ai.stream_chat(client, ai.chat_headers('key'), 'model',
+                               [{'role': 'user', 'content': 'Hi'}], placeholder)
+
+    assert reply == 'Hello!'
+    assert placeholder.text == 'Hello!'
+    assert [json.loads(r.content)['stream'] for r in requests] == [True, False]
+    # The blocking request has a different body, so it must not reuse the key
+    assert requests[0].headers['Idempotency-Key'] != requests[1].headers['Idempotency-Key']
+
+
+@pytest.mark.parametrize('status', [400, 401, 429])
+def test_client_error_is_reported_without_retry_or_fallback(ai, monkeypatch, status):
+    monkeypatch.setattr(ai, 'CHAT_RETRY_DELAY', 0)
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(status, json={'error': 'nope'})
+
+    placeholder = Placeholder()
+    with make_client(handler) as client:
+        reply = ai.stream_chat(client, ai.chat_headers('key'), 'model',
+                               [{'role': 'user', 'content': 'Hi'}], placeholder)
+
+    assert len(requests) == 1
+    assert reply.startswith('❌ Hack Club API error: HTTPStatusError')
+    assert placeholder.text == reply